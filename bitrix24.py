@@ -6,17 +6,53 @@
 Импортированные модули:
 - openpyxl: Модуль для работы с файлами Excel (.xlsx). 
 - requests: Модуль для для выполнения HTTP-запросов.
+- urllib3: Модуль используется для настройки повторных попыток HTTP-запросов.
+- dataclasses: Модуль для описания структуры данных кандидата.
 - datetime: Модуль предоставляет классы для работы с датами и временем.
 - logging: Модуль для логирования. 
+- orjson: Модуль для быстрой сериализации и разбора JSON (необязательный, при отсутствии используется json).
+- concurrent.futures: Модуль для параллельной отправки запросов в пуле потоков.
+- itertools: Модуль для разбиения данных на порции.
+- operator: Модуль для быстрого получения значений полей строки.
+- re: Модуль для разбора даты создания кандидата.
+- typing: Модуль для аннотаций типов.
+- urllib.parse: Модуль для формирования параметров команд batch-запроса.
 """
 
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dataclasses import dataclass
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain, islice
+import re
+from typing import Iterator, Mapping, Optional
+from urllib.parse import urlencode
+from operator import itemgetter
 import logging
 
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(payload) -> bytes:
+        """Сериализует данные запроса в JSON (orjson)."""
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:  # orjson не установлен - используется стандартный модуль json
+    import json
+
+    _loads = json.loads
+
+    def _dumps(payload) -> bytes:
+        """Сериализует данные запроса в компактный JSON (json)."""
+        return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
 
 # Настройка логгирования. Данные хранятся в файле bitrix24.log с уровнем логирования INFO. 
 logging.basicConfig(
@@ -30,48 +66,239 @@ logging.basicConfig(
 # (WEBHOOK - должен предоставлять доступ к определенным функциям)
 BITRIX_WEBHOOK_URL = 'https://your_domain.bitrix24.ru/rest/1/your_webhook/'
 
+# Адреса методов Bitrix24 API
+_URL_LEAD_GET = f'{BITRIX_WEBHOOK_URL}crm.lead.get'  # CRM для получения данных кандидата
+_URL_USERFIELD_ADD = f'{BITRIX_WEBHOOK_URL}crm.lead.userfield.add'  # CRM для создания поля
+_URL_LEAD_UPDATE = f'{BITRIX_WEBHOOK_URL}crm.lead.update.json'  # CRM для обновления поля
+_URL_BATCH = f'{BITRIX_WEBHOOK_URL}batch.json'  # CRM для пакетного выполнения команд
+
+# Неизменная часть описания поля для прикрепления файла к карточке кандидата
+_USERFIELD_FIELDS = {
+    "FIELD_NAME": "LINK_TO_CANDIDATS",
+    "USER_TYPE_ID": "file",
+    "MULTIPLE": "N",
+    "MANDATORY": "N",
+    "SHOW_FILTER": "N",
+    "SHOW_IN_LIST": "Y",
+    "IS_SEARCHABLE": "N",
+    "SORT": 100,
+    "XML_ID": "LINK_TO_CANDIDATE_FILE"
+}
+
+# Таймауты запросов (подключение, чтение) в секундах
+_TIMEOUT = (3.05, 30)
+
+# Максимальное число параллельных запросов при создании смарт процессов
+_MAX_WORKERS = 16
+
+# Максимальное число команд в одном batch-запросе Bitrix24
+_BATCH_SIZE = 50
+
+# Размер порции записей, для которой одновременно создаются задачи отправки
+# (по одному batch-запросу на каждый поток пула)
+_CHUNK_SIZE = _MAX_WORKERS * _BATCH_SIZE
+
+# Ответы, при которых POST-запрос можно безопасно отправить повторно:
+# Bitrix24 отклонил запрос (превышение лимита запросов), не выполняя команды.
+_POST_RETRY_STATUSES = frozenset([429, 503])
+
+
+class _BitrixRetry(Retry):
+    """Политика повторных попыток для запросов к Bitrix24.
+    
+    GET повторяется при сбоях соединения, ошибках чтения и ответах из status_forcelist.
+    POST (создание лидов и полей) не идемпотентен, поэтому повторяется только если запрос
+    не дошел до сервера (ошибка подключения) или был отклонен с ответом 429/503.
+    Ошибки чтения для POST не повторяются, так как POST не входит в allowed_methods.
+    """
+    
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method and method.upper() == 'POST':
+            return status_code in _POST_RETRY_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+# Общая HTTP-сессия для всех запросов к Bitrix24: keep-alive и пул соединений
+# позволяют не открывать новое TCP/TLS соединение на каждый вызов API.
+# Повторные попытки с экспоненциальной задержкой выполняются адаптером (см. _BitrixRetry),
+# с учетом заголовка Retry-After.
+_SESSION = requests.Session()
+_SESSION.mount(BITRIX_WEBHOOK_URL, HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=2 * _MAX_WORKERS,  # пул не меньше числа потоков, иначе соединения не переиспользуются
+    max_retries=_BitrixRetry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+    ),
+))
+
+# Заголовки и стили заголовков файла с данными кандидата.
+# Стили создаются один раз и переиспользуются при каждом сохранении.
+_HEADERS = ('ID', 'Имя', 'Фамилия', 'Телефон', 'Email', 'Дата создания')
+_HEADER_FONT = Font(bold=True)
+_ALIGN_CENTER = Alignment(horizontal='center')
+
+# Дата в начале строки DATE_CREATE (ГГГГ-ММ-ДД), часовой пояс не нужен
+_DATE_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})')
+
+# Ключи данных строки файла для создания смарт процесса (в порядке столбцов)
+_ROW_KEYS = ('TITLE', 'NAME', 'LAST_NAME', 'PHONE', 'EMAIL')
+_get_row_fields = itemgetter(*_ROW_KEYS)  # значения всех ключей строки одним вызовом
+
+# Заголовки для запросов с телом в формате JSON
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Кэш данных кандидатов: id кандидата -> тело ответа crm.lead.get в байтах (в порядке последнего использования)
+_CANDIDATE_CACHE_SIZE = 1024
+_candidate_cache = {}
+
+
+def get_session() -> requests.Session:
+    """Возвращает общую HTTP-сессию, через которую выполняются запросы к Bitrix24.
+    
+    Позволяет подключить собственные адаптеры (например, с другой политикой повторов).
+    
+    :return: объект requests.Session.
+    """
+    return _SESSION
+
+
+def _post_json(session: requests.Session, url: str, payload: dict) -> requests.Response:
+    """Отправляет POST-запрос к Bitrix24 с телом в формате JSON.
+    
+    :param session: HTTP-сессия для отправки запроса.
+    :param url: адрес метода API.
+    :param payload: данные запроса.
+    :return: ответ сервера.
+    """
+    return session.post(url, data=_dumps(payload), headers=_JSON_HEADERS, timeout=_TIMEOUT)
+
+
+def clear_cache():
+    """Очищает кэш данных кандидатов, полученных функцией get_candidate_data."""
+    _candidate_cache.clear()
+
 
 def get_candidate_data(candidate_id: int) -> dict:
     """Получает данные кандидата из системы Bitrix24 по уникальному идентификатору.
     
+    Успешные ответы кэшируются (не более _CANDIDATE_CACHE_SIZE кандидатов), повторный запрос
+    того же кандидата не обращается к API. Каждый вызов возвращает новый словарь, поэтому
+    его изменение (в том числе вложенных данных) не затрагивает кэш.
+    Для получения актуальных данных используйте clear_cache().
+    
     :param candidate_id: уникальный идентификатор кандидата.
     :return: словарь с информацией о кандидате, или сообщение об ошибке.
     """
     
-    logging.info(f'start get_candidate_data - {candidate_id}')
+    logging.info('start get_candidate_data - %s', candidate_id)
+    
+    cached = _candidate_cache.pop(candidate_id, None)
+    if cached is not None:
+        _candidate_cache[candidate_id] = cached  # перемещаем в конец как последний использованный
+        logging.info('Candidate details taken from cache')
+        return _loads(cached)  # в кэше хранятся неизменяемые байты, словарь создается заново
     
-    url = f"{BITRIX_WEBHOOK_URL}crm.lead.get"
     params = {"id": candidate_id}
     
     try: 
-        response = requests.get(url, params=params)
+        response = _SESSION.get(_URL_LEAD_GET, params=params, timeout=_TIMEOUT)
         response.raise_for_status()  # проверка успешности ответа
 
-        logging.info(f'Candidate details received')
+        logging.info('Candidate details received')
         try:
-            candidate_data = response.json()
+            candidate_data = _loads(response.content)
+            if 'result' in candidate_data:  # кэшируются только успешные ответы
+                if len(_candidate_cache) >= _CANDIDATE_CACHE_SIZE:
+                    _candidate_cache.pop(next(iter(_candidate_cache)), None)  # удаляем самый давний
+                _candidate_cache[candidate_id] = response.content
             return candidate_data  # Возвращаем данные в случае успешного запроса
         except ValueError as json_error:
             logging.error("Error decoding JSON. Response text: %s", response.text)
             logging.exception("JSON decode error: %s", json_error)
             return {"error": "Error decoding JSON from response."}
         
-    except requests.exceptions.HTTPError as http_error:
-        logging.error("HTTP error: %s, Status code: %d", http_error, http_error.response.status_code)
-        return {"error": f"HTTP error: {http_error}"}
-    except requests.exceptions.ConnectionError:
-        logging.error("Connection error occurred while attempting to reach Bitrix24.")
-        return {"error": "Connection error occurred."}
-    except requests.exceptions.Timeout:
-        logging.error("The request timed out.")
-        return {"error": "Request timed out."}
     except requests.exceptions.RequestException as req_error:
-        logging.error("Request exception: %s", req_error)
+        # повторные попытки при 429/5xx и сбоях соединения уже выполнены адаптером сессии
+        logging.error("Request exception: %s, Status code: %s", req_error, getattr(req_error.response, 'status_code', None))
         return {"error": f"Request failed: {req_error}"}
     except Exception as e:
         logging.error("An unexpected error occurred: %s", e)
         return {"error": "An unexpected error occurred."}
 
+@dataclass(frozen=True)
+class Candidate:
+    """Основные данные кандидата из Bitrix24."""
+    id: int
+    name: str
+    last_name: str
+    phone: str
+    email: str
+    created: str
+
+
+def _parse_candidate(candidate_data: Mapping) -> Candidate:
+    """Извлекает основные данные кандидата из ответа crm.lead.get.
+    
+    :param candidate_data: ответ Bitrix24 с ключом 'result'.
+    :return: объект Candidate.
+    """
+    result = candidate_data['result']
+    phone_list = result.get('PHONE') or []
+    email_list = result.get('EMAIL') or []
+    return Candidate(
+        id=int(result['ID']),
+        name=result.get('NAME') or '',
+        last_name=result.get('LAST_NAME') or '',
+        phone=phone_list[0].get('VALUE', '') if phone_list else '',
+        email=email_list[0].get('VALUE', '') if email_list else '',
+        created=result.get('DATE_CREATE') or '',
+    )
+
+
+def get_candidate(candidate_id: int) -> Optional[Candidate]:
+    """Получает основные данные кандидата из системы Bitrix24 по уникальному идентификатору.
+    
+    :param candidate_id: уникальный идентификатор кандидата.
+    :return: объект Candidate или None, если данные получить не удалось.
+    """
+    candidate_data = get_candidate_data(candidate_id)
+    if 'result' not in candidate_data:
+        logging.warning("No candidate data for id %s", candidate_id)
+        return None
+    
+    try:
+        return _parse_candidate(candidate_data)
+    except (KeyError, TypeError, ValueError) as e:
+        logging.error("Error parsing candidate data: %s", e)
+        return None
+
+
+def _candidate_row(result: dict) -> list:
+    """Формирует строку файла Excel из данных кандидата Bitrix24.
+    
+    Строка собирается целиком, чтобы записать ее одним вызовом sheet.append
+    (в том числе при записи данных нескольких кандидатов).
+    
+    :param result: данные кандидата (значение ключа 'result' ответа crm.lead.get).
+    :return: список значений в порядке столбцов _HEADERS.
+    """
+    get = result.get
+    phone_list = get('PHONE') or []
+    email_list = get('EMAIL') or []
+    phone = phone_list[0].get('VALUE', 'N/A') if phone_list else 'N/A'
+    email = email_list[0].get('VALUE', 'N/A') if email_list else 'N/A'
+    
+    # Дата в формате Bitrix24 (2023-10-01T12:00:00+03:00) переводится в ДД.ММ.ГГГГ
+    match = _DATE_RE.match(get('DATE_CREATE') or '')
+    date_str = f"{match.group(3)}.{match.group(2)}.{match.group(1)}" if match else 'N/A'
+    
+    return [get('ID', 'N/A'), get('NAME', 'N/A'), get('LAST_NAME', 'N/A'), phone, email, date_str]
+
+
 def save_candidate_to_excel(candidate_data: dict, file_name: str = 'candidates') -> str:
     """Сохраняет данные о кандидате в файл формата Excel (*.xlsx*).
     
@@ -80,50 +307,33 @@ def save_candidate_to_excel(candidate_data: dict, file_name: str = 'candidates')
     :return: сообщение о наличии сохраненных данных или об ошибке.
     """
     try: 
-        logging.info(f'start save_candidate_to_excel')
+        logging.info('start save_candidate_to_excel')
         
         # Проверяем, есть ли необходимые данные в candidate_data
         if 'result' not in candidate_data:
             logging.warning("No 'result' key found in candidate data.")
             return "No candidate data to save."
         
-        # Создаем новую книгу Excel
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = 'Кандидаты'
-        
-        # Стили заголовков
-        header_font = Font(bold=True)
-        align_center = Alignment(horizontal='center')
+        # Создаем новую книгу Excel в режиме потоковой записи
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Кандидаты')
         
         # Заголовки столбцов
-        headers = ['ID', 'Имя', 'Фамилия', 'Телефон', 'Email', 'Дата создания']
-        sheet.append(headers)
-        for col, value in enumerate(headers, start=1):
-            cell = sheet.cell(row=1, column=col)
-            cell.value = value
-            cell.font = header_font
-            cell.alignment = align_center
-
-        # Заполнение данных
-        row_num = 2
-        result = candidate_data['result']
-        sheet.cell(row=row_num, column=1).value = result.get('ID', 'N/A')
-        sheet.cell(row=row_num, column=2).value = result.get('NAME', 'N/A')
-        sheet.cell(row=row_num, column=3).value = result.get('LAST_NAME', 'N/A')
-        
-        phone_list = result.get('PHONE', [])
-        email_list = result.get('EMAIL', [])
-        
-        sheet.cell(row=row_num, column=4).value = phone_list[0]['VALUE'] if phone_list else 'N/A'
-        sheet.cell(row=row_num, column=5).value = email_list[0]['VALUE'] if email_list else 'N/A'
-        
-        sheet.cell(row=row_num, column=6).value = datetime.strptime(result.get('DATE_CREATE', ''), '%Y-%m-%dT%H:%M:%S%z').strftime('%d.%m.%Y') if 'DATE_CREATE' in result else 'N/A'
+        header_row = []
+        for value in _HEADERS:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.font = _HEADER_FONT
+            cell.alignment = _ALIGN_CENTER
+            header_row.append(cell)
+        sheet.append(header_row)
+
+        # Заполнение данных одной строкой
+        sheet.append(_candidate_row(candidate_data['result']))
         
         # Сохранение файла
         file_name_save = f"{file_name}_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
         workbook.save(file_name_save)
-        logging.info(f'Candidate data saved in {file_name_save}')
+        logging.info('Candidate data saved in %s', file_name_save)
         return f"Данные кандидата сохранены в {file_name_save}"
     
     except FileNotFoundError as fnf_error:
@@ -146,46 +356,35 @@ def upload_file_to_lead(file_name: str) -> int:
     
     logging.info('Start upload_file_to_lead')
     
-    url = f'{BITRIX_WEBHOOK_URL}crm.lead.userfield.add'  # CRM для создания поля
     try:
-        # Подготовка полезной нагрузки
+        # Подготовка полезной нагрузки: к неизменной части добавляются подписи поля
+        prefix = file_name.partition('_')[0]  # имя файла до первого '_'
         payload = {
             "fields": {
-                "FIELD_NAME": "LINK_TO_CANDIDATS",
-                "EDIT_FORM_LABEL": f"Ссылка на файл {file_name.split('_')[0]}",
-                "LIST_COLUMN_LABEL": f"Ссылка на файл '{file_name.split('_')[0]}'",
-                "USER_TYPE_ID": "file",
-                "MULTIPLE": "N",
-                "MANDATORY": "N",
-                "SHOW_FILTER": "N",
-                "SHOW_IN_LIST": "Y",
-                "IS_SEARCHABLE": "N",
-                "SORT": 100,
-                "XML_ID": "LINK_TO_CANDIDATE_FILE"
+                **_USERFIELD_FIELDS,
+                "EDIT_FORM_LABEL": f"Ссылка на файл {prefix}",
+                "LIST_COLUMN_LABEL": f"Ссылка на файл '{prefix}'",
             }
         }
 
         # Отправка запроса
-        response = requests.post(url, json=payload)
+        response = _post_json(_SESSION, _URL_USERFIELD_ADD, payload)
         response.raise_for_status()  # Проверка успешности запроса
 
-        result = response.json()
+        result = _loads(response.content)
 
         if 'result' in result:
-            logging.info(f"Поле успешно создано с ID: {result['result']}")
+            logging.info("Поле успешно создано с ID: %s", result['result'])
             return result['result']
         else:
-            logging.error(f"Failed to create field: {result}")
+            logging.error("Failed to create field: %s", result)
             return None
 
-    except requests.exceptions.HTTPError as http_error:
-        logging.error(f"HTTP error occurred: {http_error} - Status code: {http_error.response.status_code}")
-        return None
     except requests.exceptions.RequestException as req_error:
-        logging.error(f"Request exception occurred: {req_error}")
+        logging.error("Request exception occurred: %s - Status code: %s", req_error, getattr(req_error.response, 'status_code', None))
         return None
     except Exception as e:
-        logging.error(f"Ошибка при создании поля: {e}")
+        logging.error("Ошибка при создании поля: %s", e)
         return None
 
 
@@ -199,7 +398,6 @@ def save_link_to_file(field_id: int, file_path: str, candidate_id: int):
     
     logging.info('Start save_link_to_file')
     
-    url = f'{BITRIX_WEBHOOK_URL}crm.lead.update.json'  # CRM для обновления поля
     try: 
         payload = {
             "id": candidate_id,
@@ -209,101 +407,191 @@ def save_link_to_file(field_id: int, file_path: str, candidate_id: int):
         }
 
         # Отправка запроса
-        response = requests.post(url, json=payload)
+        response = _post_json(_SESSION, _URL_LEAD_UPDATE, payload)
         response.raise_for_status()  # Проверка успешности запроса
         
-        result = response.json()
+        result = _loads(response.content)
         
         if 'result' in result:
-            logging.info(f"Ссылка на файл успешно сохранена у кандидата - {candidate_id}")
+            logging.info("Ссылка на файл успешно сохранена у кандидата - %s", candidate_id)
         else:
-            logging.error(f"Failed to save file link for candidate {candidate_id}: {result}")
+            logging.error("Failed to save file link for candidate %s: %s", candidate_id, result)
 
-    except requests.exceptions.HTTPError as http_error:
-        logging.error(f"HTTP error while saving link: {http_error} - Status code: {http_error.response.status_code}")
     except requests.exceptions.RequestException as req_error:
-        logging.error(f"Request exception occurred while saving link: {req_error}")
+        logging.error("Request exception occurred while saving link: %s - Status code: %s", req_error, getattr(req_error.response, 'status_code', None))
     except Exception as e:
-        logging.error(f"Ошибка при сохранении ссылки на файл: {e}")
+        logging.error("Ошибка при сохранении ссылки на файл: %s", e)
 
-def read_from_excel(file_name: str) -> list:
+def read_from_excel(file_name: str) -> Iterator[dict]:
     """ Функция предназначена чтения файла формата Excel (*.xlsx*)
     
+    Файл читается в потоковом режиме (read_only), строки отдаются по одной,
+    поэтому объем занимаемой памяти не зависит от размера файла.
+    
     :param file_name: имя файла, который необходимо открыть
-    :return: список с данными из файла.
+    :return: генератор словарей с данными строк файла.
     """
     
     logging.info('Start reading from Excel file: %s', file_name)
     try:
-        # Открытие книги
-        wb = openpyxl.load_workbook(file_name)
-        ws = wb.active
-        
-        data = []
-        headers = next(ws.iter_rows(values_only=True), None)  # Пропустить первую строку с заголовками
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if len(row) < 5:  # Проверка на количество колонок
-                logging.warning("Row has insufficient columns: %s", row)
-                continue  # Пропускаем некорректные строки
-            data.append({
-                'TITLE': row[0], 
-                'NAME': row[1],  
-                'LAST_NAME': row[2],  
-                'PHONE': row[3],  
-                'EMAIL': row[4]
-            })
-        logging.info('File read successfully: %s', file_name)
-        return data
+        # Открытие книги в режиме потокового чтения
+        wb = openpyxl.load_workbook(file_name, read_only=True, data_only=True, keep_links=False)
     except FileNotFoundError:
         logging.error("File not found: %s", file_name)
-        return []
+        return
     except openpyxl.utils.exceptions.InvalidFileException:
         logging.error("Invalid file format: %s", file_name)
-        return []
+        return
+    except Exception as e:
+        logging.error("Error reading Excel file: %s", e)
+        return
+    
+    try:
+        ws = wb.active
+        ws.reset_dimensions()  # размеры листа в файле могут быть указаны неверно
+        
+        # Первая строка - заголовки. Читаются только нужные столбцы, недостающие ячейки
+        # в конце строки дополняются значением None.
+        for row in ws.iter_rows(min_row=2, max_col=len(_ROW_KEYS), values_only=True):
+            if not any(row):  # Пропускаем пустые строки
+                continue
+            item = dict(zip(_ROW_KEYS, row))
+            phone = item['PHONE']
+            # номер телефона сохранен в Excel как число (логические и дробные значения не меняются)
+            if isinstance(phone, int) and not isinstance(phone, bool):
+                item['PHONE'] = str(phone)
+            elif isinstance(phone, float) and phone.is_integer():
+                item['PHONE'] = str(int(phone))
+            yield item
+        logging.info('File read successfully: %s', file_name)
     except Exception as e:
         logging.error("Error reading Excel file: %s", e)
-        return []
+    finally:
+        wb.close()  # в режиме read_only файл остается открытым до явного закрытия
 
-def create_smart_process(data: list):
-    """Функция предназначена создания смарт процесса в Bitrix24.
+
+def _iter_chunks(data, size: int):
+    """Разбивает данные на порции заданного размера.
     
-    :param data: данные для загрузки смарт процесса (list).
+    :param data: итерируемый объект с данными.
+    :param size: максимальный размер порции.
+    :return: генератор списков длиной не более size.
     """
+    iterator = iter(data)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _lead_command(title, name, last_name, phone, email) -> str:
+    """Формирует команду crm.lead.add для batch-запроса Bitrix24.
     
-    logging.info('Starting to create smart processes')
-    
-    if not data:
-        logging.warning("No data provided to create smart processes.")
-        return
+    Параметры передаются в формате запроса PHP (fields[PHONE][0][VALUE]=...),
+    список параметров собирается сразу, без промежуточного словаря лида.
     
-    smart_process_url = f'{BITRIX_WEBHOOK_URL}crm.lead.add'  # CRM для создания процесса
+    :return: строка команды.
+    """
+    params = [
+        ('fields[TITLE]', '' if title is None else title),
+        ('fields[NAME]', name if name else 'Empty name'),
+        ('fields[LAST_NAME]', '' if last_name is None else last_name),
+    ]
+    if phone:
+        params += (('fields[PHONE][0][VALUE]', phone), ('fields[PHONE][0][VALUE_TYPE]', 'HOME'))
+    if email:
+        params += (('fields[EMAIL][0][VALUE]', email), ('fields[EMAIL][0][VALUE_TYPE]', 'HOME'))
+    return f'crm.lead.add?{urlencode(params)}'
+
 
-    for item in data:
+def _prepare_leads(items: list) -> list:
+    """Подготавливает команды создания лидов для отправки в Bitrix24, пропуская некорректные записи.
+    
+    :param items: список записей, прочитанных из файла.
+    :return: список пар (название лида, команда crm.lead.add).
+    """
+    leads = []
+    for item in items:
         if not ('TITLE' in item and 'LAST_NAME' in item):
             logging.warning("Item missing required fields: %s", item)
             continue
         
-        lead_data = {
-            'fields': {
-                'TITLE': item['TITLE'],
-                'NAME': item['NAME'] if item['NAME'] else 'Empty name',
-                'LAST_NAME': item['LAST_NAME'],
-                'PHONE': [{'VALUE': item['PHONE'], 'VALUE_TYPE': 'HOME'}] if item['PHONE'] else [],
-                'EMAIL': [{'VALUE': item['EMAIL'], 'VALUE_TYPE': 'HOME'}] if item['EMAIL'] else []
-            }
+        fields = _get_row_fields(item)
+        leads.append((fields[0], _lead_command(*fields)))
+    return leads
+
+
+def _post_lead_batch(session: requests.Session, leads: list) -> dict:
+    """Отправляет один batch-запрос на создание до _BATCH_SIZE лидов (смарт процессов) в Bitrix24.
+    
+    :param session: HTTP-сессия для отправки запроса.
+    :param leads: пары (название лида, команда crm.lead.add).
+    :return: ответ batch-запроса. При успехе ключ 'result' содержит 'result' и 'result_error'
+        по командам c0, c1, ..., при ошибке всего запроса - ключи 'error' и 'error_description'.
+    """
+    payload = {
+        'halt': 0,  # ошибка одной команды не останавливает выполнение остальных
+        'cmd': {
+            f'c{i}': command for i, (_, command) in enumerate(leads)
         }
+    }
+    response = _post_json(session, _URL_BATCH, payload)
+    response.raise_for_status()  # выбросить исключение для ответа с ошибкой
+    return _loads(response.content)
 
-        try:
-            response = requests.post(smart_process_url, json=lead_data)
-            response.raise_for_status()  # выбросить исключение для ответа с ошибкой
-            
-            logging.info("Смарт-процесс '%s' успешно создан!", item['TITLE'])
-        except requests.exceptions.HTTPError as http_error:
-            logging.error("Ошибка HTTP при создании смарт-процесса: %s, статус код: %d", http_error, http_error.response.status_code)
-        except requests.exceptions.RequestException as req_error:
-            logging.error("Ошибка запроса при создании смарт-процесса: %s", req_error)
-        except Exception as e:
-            logging.error("Неожиданная ошибка при создании смарт-процесса: %s", e)
+
+def create_smart_process(data: list):
+    """Функция предназначена создания смарт процесса в Bitrix24.
+    
+    Лиды создаются batch-запросами по _BATCH_SIZE команд, запросы отправляются параллельно
+    в пуле потоков (не более _MAX_WORKERS одновременно) порциями по _CHUNK_SIZE записей.
+    Ошибка одного запроса или команды не прерывает загрузку остальных.
+    
+    :param data: данные для загрузки смарт процесса (список или генератор словарей).
+    """
+    
+    logging.info('Starting to create smart processes')
+    
+    # Уровень логирования проверяется один раз, а не для каждой созданной записи
+    log_success = logging.getLogger().isEnabledFor(logging.INFO)
+    processed = 0
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        # Данные обрабатываются порциями, чтобы не держать в памяти задачи для всего файла
+        for chunk in _iter_chunks(data, _CHUNK_SIZE):
+            processed += len(chunk)
+            futures = {
+                executor.submit(_post_lead_batch, _SESSION, batch): batch
+                for batch in _iter_chunks(_prepare_leads(chunk), _BATCH_SIZE)
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    response_data = future.result()
+                except requests.exceptions.RequestException as req_error:
+                    logging.error("Ошибка запроса при создании смарт-процессов (%d шт.): %s, статус код: %s", len(batch), req_error, getattr(req_error.response, 'status_code', None))
+                    continue
+                except Exception as e:
+                    logging.error("Неожиданная ошибка при создании смарт-процессов (%d шт.): %s", len(batch), e)
+                    continue
+                
+                # Без ключа 'result' запрос целиком отклонен (например, неверный вебхук), лиды не созданы
+                if 'result' not in response_data:
+                    logging.error("Ошибка batch-запроса при создании смарт-процессов (%d шт.): %s - %s", len(batch), response_data.get('error'), response_data.get('error_description'))
+                    continue
+                
+                # Bitrix24 возвращает пустой список вместо словаря, если результатов или ошибок нет
+                results = response_data['result'].get('result') or {}
+                errors = response_data['result'].get('result_error') or {}
+                for i, (title, _) in enumerate(batch):
+                    key = f'c{i}'
+                    error = errors.get(key)
+                    if error:
+                        logging.error("Ошибка при создании смарт-процесса '%s': %s", title, error)
+                    elif key not in results:
+                        logging.warning("Нет результата создания смарт-процесса '%s' в ответе Bitrix24", title)
+                    elif log_success:
+                        logging.info("Смарт-процесс '%s' успешно создан!", title)
+
+    if not processed:
+        logging.warning("No data provided to create smart processes.")
 
       
 def main_candidate_data():
@@ -334,8 +622,9 @@ def main_smart_process():
     с помощью функции create_smart_process 
     """
     data = read_from_excel('test_crm.xlsx')
-    if data:
-        create_smart_process(data)
+    first_item = next(data, None)  # генератор всегда истинен, проверяем наличие первой строки
+    if first_item is not None:
+        create_smart_process(chain([first_item], data))
         print('Добавление смарт процессов завершено!')
 
 
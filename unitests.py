@@ -1,8 +1,28 @@
+import json
+import os
+import tempfile
+import threading
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
+from urllib.parse import parse_qsl
+
+import openpyxl
+import requests
+from urllib3.exceptions import ConnectTimeoutError, ReadTimeoutError
 
 from bitrix24 import (
     BITRIX_WEBHOOK_URL,
+    _CHUNK_SIZE,
+    _MAX_WORKERS,
+    _SESSION,
+    _TIMEOUT,
+    _URL_BATCH,
+    _URL_LEAD_UPDATE,
+    clear_cache,
+    _candidate_row,
+    Candidate,
+    get_candidate,
     get_candidate_data,
     save_candidate_to_excel,
     upload_file_to_lead, 
@@ -12,20 +32,119 @@ from bitrix24 import (
 )
 
 
+# Ответ crm.lead.get с данными кандидата
+_CANDIDATE = {'result': {'ID': 123, 'NAME': 'Иван', 'LAST_NAME': 'Иванов', 'PHONE': [{'VALUE': '+79991234567'}], 'EMAIL': [{'VALUE': 'ivanov@example.com'}], 'DATE_CREATE': '2023-10-01T12:00:00+0300'}}
+
+# Ответ batch.json без ошибок
+_BATCH_OK = {'result': {'result': {}, 'result_error': []}}
+
+
+def _response(body: dict, status_code: int = 200) -> SimpleNamespace:
+    """Фиктивный ответ API с телом в формате JSON (только используемые атрибуты requests.Response).
+    
+    raise_for_status() выбрасывает requests.HTTPError для статусов 4xx/5xx.
+    """
+    content = json.dumps(body).encode()
+    response = SimpleNamespace(status_code=status_code, content=content, text=content.decode())
+
+    def raise_for_status():
+        if status_code >= 400:
+            raise requests.HTTPError(f'{status_code} Error', response=response)
+
+    response.raise_for_status = raise_for_status
+    return response
+
+
+def _leads(start: int, stop: int) -> list:
+    """Записи для создания смарт процессов с номерами от start до stop (не включая)."""
+    return [
+        {
+            'TITLE': f'Title{i}',
+            'NAME': f'Name{i}',
+            'LAST_NAME': f'LastName{i}',
+            'PHONE': f'Phone{i}',
+            'EMAIL': f'email{i}@example.com'
+        }
+        for i in range(start, stop)
+    ]
+
+
 class TestBitrix24(unittest.TestCase):
 
-    @patch('requests.get')
-    def test_get_candidate_data(self, mock_requests_get):
+    @classmethod
+    def setUpClass(cls):
+        # Запросы к API подменяются один раз на весь класс, а не в каждом тесте
+        cls._get_patcher = patch.object(_SESSION, 'get')
+        cls._post_patcher = patch.object(_SESSION, 'post')
+        cls.mock_get = cls._get_patcher.start()
+        cls.mock_post = cls._post_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._post_patcher.stop()
+        cls._get_patcher.stop()
+
+    def setUp(self):
+        # Сбрасываем вызовы и настроенные ответы предыдущего теста
+        self.mock_get.reset_mock(return_value=True, side_effect=True)
+        self.mock_post.reset_mock(return_value=True, side_effect=True)
+        # Данные кандидатов кэшируются, тесты не должны влиять друг на друга
+        clear_cache()
+
+    def test_get_candidate_data(self):
         # Подготавливаем фиктивный ответ от API
-        mock_response = MagicMock()
-        mock_response.json.return_value = {'result': {'ID': 123, 'NAME': 'Иван', 'LAST_NAME': 'Иванов', 'PHONE': [{'VALUE': '+79991234567'}], 'EMAIL': [{'VALUE': 'ivanov@example.com'}], 'DATE_CREATE': '2023-10-01T12:00:00+0300'}}
-        mock_requests_get.return_value = mock_response
+        self.mock_get.return_value = _response(_CANDIDATE)
 
         # Вызываем функцию
         result = get_candidate_data(123)
 
         # Проверяем результат
-        self.assertEqual(result, {'result': {'ID': 123, 'NAME': 'Иван', 'LAST_NAME': 'Иванов', 'PHONE': [{'VALUE': '+79991234567'}], 'EMAIL': [{'VALUE': 'ivanov@example.com'}], 'DATE_CREATE': '2023-10-01T12:00:00+0300'}})
+        self.assertEqual(result, _CANDIDATE)
+
+    def test_get_candidate_data_cached(self):
+        # Подготавливаем фиктивный ответ от API
+        self.mock_get.return_value = _response(_CANDIDATE)
+
+        # Повторный запрос того же кандидата берется из кэша
+        first = get_candidate_data(123)
+        second = get_candidate_data(123)
+
+        self.assertEqual(self.mock_get.call_count, 1)
+        self.assertEqual(first, second)
+
+        # Изменение полученных данных, в том числе вложенных, не затрагивает кэш
+        second['result']['PHONE'][0]['VALUE'] = '+70000000000'
+        self.assertEqual(get_candidate_data(123), first)
+
+        # После очистки кэша данные запрашиваются заново
+        clear_cache()
+        get_candidate_data(123)
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_get_candidate_data_error_not_cached(self):
+        # Ответ с ошибкой не кэшируется
+        self.mock_get.side_effect = [requests.exceptions.ConnectionError('boom'), _response(_CANDIDATE)]
+
+        self.assertIn('error', get_candidate_data(123))
+        self.assertEqual(get_candidate_data(123), _CANDIDATE)
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_get_candidate(self):
+        # Подготавливаем фиктивный ответ от API
+        self.mock_get.return_value = _response(_CANDIDATE)
+
+        # Вызываем функцию
+        result = get_candidate(123)
+
+        # Проверяем результат
+        self.assertEqual(result, Candidate(123, 'Иван', 'Иванов', '+79991234567', 'ivanov@example.com', '2023-10-01T12:00:00+0300'))
+
+    def test_get_candidate_error(self):
+        # Ошибка запроса - данные кандидата не получены
+        self.mock_get.side_effect = requests.exceptions.ConnectionError('boom')
+
+        # Вызываем функцию и проверяем результат
+        self.assertIsNone(get_candidate(123))
 
     @patch('openpyxl.Workbook')
     def test_save_candidate_to_excel(self, mock_workbook):
@@ -38,12 +157,37 @@ class TestBitrix24(unittest.TestCase):
         # Проверяем результат
         self.assertIn('Данные кандидата сохранены в candidates_', result)
 
-    @patch('requests.post')
-    def test_upload_file_to_lead_success(self, mock_requests_post):
+        # Книга создается в режиме потоковой записи: строка заголовков и строка данных
+        mock_workbook.assert_called_once_with(write_only=True)
+        mock_sheet = mock_workbook.return_value.create_sheet.return_value
+        self.assertEqual(mock_sheet.append.call_count, 2)
+        self.assertEqual(mock_sheet.append.call_args.args[0], [456, 'Петр', 'Петров', '+79876543210', 'petrov@example.com', '02.10.2023'])
+
+    def test_retry_policy(self):
+        # GET повторяется при ответах 5xx и ошибках чтения, POST - только при отклонении запроса (429/503)
+        retry = _SESSION.get_adapter(BITRIX_WEBHOOK_URL).max_retries
+        self.assertTrue(retry.is_retry('GET', 500))
+        self.assertTrue(retry.is_retry('POST', 429))
+        self.assertTrue(retry.is_retry('POST', 503))
+        self.assertFalse(retry.is_retry('POST', 500))
+        self.assertFalse(retry.is_retry('POST', 504))
+        with self.assertRaises(ReadTimeoutError):
+            retry.increment('POST', _URL_BATCH, error=ReadTimeoutError(None, _URL_BATCH, 'timeout'))
+        self.assertFalse(retry.increment('GET', _URL_BATCH, error=ReadTimeoutError(None, _URL_BATCH, 'timeout')).is_exhausted())
+        # Ошибка подключения повторяется и для POST - запрос не дошел до сервера
+        self.assertFalse(retry.increment('POST', _URL_BATCH, error=ConnectTimeoutError()).is_exhausted())
+
+    def test_candidate_row(self):
+        # Дата создания переводится в формат ДД.ММ.ГГГГ, некорректная дата заменяется на 'N/A'
+        result = {'ID': 456, 'NAME': 'Петр', 'LAST_NAME': 'Петров', 'PHONE': [{'VALUE': '+79876543210'}], 'DATE_CREATE': '2023-10-02T13:00:00+03:00'}
+        self.assertEqual(_candidate_row(result), [456, 'Петр', 'Петров', '+79876543210', 'N/A', '02.10.2023'])
+
+        result['DATE_CREATE'] = 'not a date'
+        self.assertEqual(_candidate_row(result)[5], 'N/A')
+
+    def test_upload_file_to_lead_success(self):
         # Подготавливаем фиктивный ответ от API
-        mock_response = MagicMock()
-        mock_response.json.return_value = {'result': 42}
-        mock_requests_post.return_value = mock_response
+        self.mock_post.return_value = _response({'result': 42})
 
         # Вызываем функцию
         result = upload_file_to_lead('test_file.xlsx')
@@ -52,12 +196,9 @@ class TestBitrix24(unittest.TestCase):
         self.assertEqual(result, 42)
 
 
-    @patch('requests.post')
-    def test_save_link_to_file_success(self, mock_requests_post):
+    def test_save_link_to_file_success(self):
         # Подготавливаем фиктивный ответ от API
-        mock_response = MagicMock()
-        mock_response.json.return_value = {}
-        mock_requests_post.return_value = mock_response
+        self.mock_post.return_value = _response({})
 
         # Вызываем функцию
         save_link_to_file(42, '/path/to/file.xlsx', 123)
@@ -69,7 +210,12 @@ class TestBitrix24(unittest.TestCase):
                 42: {"value": "/path/to/file.xlsx"}
             }
         }
-        mock_requests_post.assert_called_once_with(f'{BITRIX_WEBHOOK_URL}crm.lead.update.json', json=expected_payload)
+        self.mock_post.assert_called_once()
+        args, kwargs = self.mock_post.call_args
+        self.assertEqual(args[0], _URL_LEAD_UPDATE)
+        self.assertEqual(kwargs['timeout'], _TIMEOUT)
+        # Тело запроса передается сериализованным, ключи JSON-объекта - строки
+        self.assertEqual(json.loads(kwargs['data']), json.loads(json.dumps(expected_payload)))
 
 
     @patch('openpyxl.load_workbook')
@@ -85,86 +231,176 @@ class TestBitrix24(unittest.TestCase):
         mock_load_workbook.return_value = mock_wb
 
         # Вызываем функцию
-        result = read_from_excel('test.xlsx')
+        result = list(read_from_excel('test.xlsx'))
 
         # Проверяем результат
-        expected_result = [
-            {
-                'TITLE': 'Title1',
-                'NAME': 'Name1',
-                'LAST_NAME': 'LastName1',
-                'PHONE': 'Phone1',
-                'EMAIL': 'email1@example.com'
-            },
-            {
-                'TITLE': 'Title2',
-                'NAME': 'Name2',
-                'LAST_NAME': 'LastName2',
-                'PHONE': 'Phone2',
-                'EMAIL': 'email2@example.com'
-            }
+        self.assertEqual(result, _leads(1, 3))
+
+        # Файл открывается в режиме потокового чтения и закрывается после чтения
+        mock_load_workbook.assert_called_once_with('test.xlsx', read_only=True, data_only=True, keep_links=False)
+        self.assertTrue(mock_ws.iter_rows.call_args.kwargs['values_only'])
+        mock_ws.reset_dimensions.assert_called_once()
+        mock_wb.close.assert_called_once()
+
+
+    def test_read_from_excel_short_rows(self):
+        # Строки с пустыми ячейками в конце (например, без email) не должны теряться
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['TITLE', 'NAME', 'LAST_NAME', 'PHONE', 'EMAIL'])
+        sheet.append(['Title1', 'Name1', 'LastName1', 'Phone1', 'email1@example.com'])
+        sheet.append(['Title2', 'Name2', 'LastName2', 'Phone2'])
+        sheet.append(['Title3', 'Name3', 'LastName3'])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'leads.xlsx')
+            workbook.save(file_name)
+            result = list(read_from_excel(file_name))
+
+        self.assertEqual([item['TITLE'] for item in result], ['Title1', 'Title2', 'Title3'])
+        self.assertIsNone(result[1]['EMAIL'])
+        self.assertIsNone(result[2]['PHONE'])
+
+    @patch('openpyxl.load_workbook')
+    def test_read_from_excel_numeric_phone(self, mock_load_workbook):
+        # Номер телефона, сохраненный в Excel как число, читается строкой
+        mock_ws = MagicMock()
+        mock_ws.iter_rows.return_value = [
+            ('Title1', 'Name1', 'LastName1', 79991234567, 'email1@example.com'),
+            ('Title2', 'Name2', 'LastName2', 79991234568.0, 'email2@example.com'),
+            ('Title3', 'Name3', 'LastName3', True, 'email3@example.com'),
+            ('Title4', 'Name4', 'LastName4', 7999.5, 'email4@example.com')
         ]
-        self.assertEqual(result, expected_result)
+        mock_load_workbook.return_value.active = mock_ws
+
+        # Вызываем функцию
+        result = list(read_from_excel('test.xlsx'))
+
+        # Проверяем результат: логические и дробные значения не преобразуются в номер
+        self.assertEqual([item['PHONE'] for item in result], ['79991234567', '79991234568', True, 7999.5])
 
 
-    @patch('requests.post')
-    def test_create_smart_process_success(self, mock_requests_post):
+    def test_create_smart_process_success(self):
         # Подготавливаем фиктивный ответ от API
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_requests_post.return_value = mock_response
+        self.mock_post.return_value = _response({'result': {'result': {'c0': 1, 'c1': 2}, 'result_error': []}})
 
         # Вызываем функцию
-        data = [
-            {
-                'TITLE': 'Title1',
-                'NAME': 'Name1',
-                'LAST_NAME': 'LastName1',
-                'PHONE': 'Phone1',
-                'EMAIL': 'email1@example.com'
-            },
-            {
-                'TITLE': 'Title2',
-                'NAME': 'Name2',
-                'LAST_NAME': 'LastName2',
-                'PHONE': 'Phone2',
-                'EMAIL': 'email2@example.com'
-            }
-        ]
-        create_smart_process(data)
+        create_smart_process(_leads(1, 3))
 
-        # Проверяем, что запрос был отправлен дважды
-        self.assertEqual(mock_requests_post.call_count, 2)
+        # Проверяем, что обе записи отправлены одним batch-запросом
+        self.assertEqual(self.mock_post.call_count, 1)
+        args, kwargs = self.mock_post.call_args
+        self.assertEqual(args[0], _URL_BATCH)
+        cmd = json.loads(kwargs['data'])['cmd']
+        self.assertEqual(len(cmd), 2)
+        self.assertEqual(parse_qsl(cmd['c0'].partition('?')[2]), [
+            ('fields[TITLE]', 'Title1'),
+            ('fields[NAME]', 'Name1'),
+            ('fields[LAST_NAME]', 'LastName1'),
+            ('fields[PHONE][0][VALUE]', 'Phone1'),
+            ('fields[PHONE][0][VALUE_TYPE]', 'HOME'),
+            ('fields[EMAIL][0][VALUE]', 'email1@example.com'),
+            ('fields[EMAIL][0][VALUE_TYPE]', 'HOME'),
+        ])
 
-    @patch('requests.post')
-    def test_create_smart_process_failure(self, mock_requests_post):
+    def test_create_smart_process_failure(self):
         # Подготавливаем фиктивный ответ от API с ошибкой
-        mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_response.text = 'Bad Request'
-        mock_requests_post.return_value = mock_response
+        self.mock_post.return_value = _response({'result': {'result': [], 'result_error': {
+            'c0': {'error': 'ERROR_CORE', 'error_description': 'Bad Request'},
+            'c1': {'error': 'ERROR_CORE', 'error_description': 'Bad Request'},
+        }}})
 
         # Вызываем функцию
-        data = [
-            {
-                'TITLE': 'Title1',
-                'NAME': 'Name1',
-                'LAST_NAME': 'LastName1',
-                'PHONE': 'Phone1',
-                'EMAIL': 'email1@example.com'
-            },
-            {
-                'TITLE': 'Title2',
-                'NAME': 'Name2',
-                'LAST_NAME': 'LastName2',
-                'PHONE': 'Phone2',
-                'EMAIL': 'email2@example.com'
-            }
-        ]
-        create_smart_process(data)
+        with self.assertLogs(level='ERROR') as logs:
+            create_smart_process(_leads(1, 3))
+
+        # Проверяем, что обе записи отправлены одним batch-запросом
+        self.assertEqual(self.mock_post.call_count, 1)
+        args, kwargs = self.mock_post.call_args
+        self.assertEqual(args[0], _URL_BATCH)
+        self.assertEqual(len(json.loads(kwargs['data'])['cmd']), 2)
+
+        # Ошибка каждой записи записана в лог ровно один раз
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(sum("'Title1'" in line for line in logs.output), 1)
+        self.assertEqual(sum("'Title2'" in line for line in logs.output), 1)
+
+    def test_create_smart_process_request_error(self):
+        # Batch-запрос из 50 команд завершается ошибкой соединения, остальные - успешно
+        def post(url, data, **kwargs):
+            if len(json.loads(data)['cmd']) == 50:
+                raise requests.exceptions.ConnectionError('boom')
+            return _response(_BATCH_OK)
+
+        self.mock_post.side_effect = post
+
+        # Вызываем функцию с данными на два batch-запроса (50 + 1 запись)
+        with self.assertLogs(level='ERROR') as logs:
+            create_smart_process(_leads(0, 51))
+
+        # Ошибка одного запроса не прерывает отправку остальных
+        self.assertEqual(self.mock_post.call_count, 2)
+
+        # В лог записана одна ошибка - для неудачного batch-запроса
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('(50 шт.)', logs.output[0])
+        self.assertIn('boom', logs.output[0])
+
+    def test_create_smart_process_http_error(self):
+        # Bitrix24 отклоняет batch-запрос с ответом 503
+        self.mock_post.return_value = _response({'error': 'QUERY_LIMIT_EXCEEDED'}, 503)
+
+        # Вызываем функцию
+        with self.assertLogs(level='ERROR') as logs:
+            create_smart_process(_leads(1, 3))
+
+        # Ошибка записана в лог один раз на batch-запрос, с кодом ответа
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('503', logs.output[0])
+
+    def test_create_smart_process_missing_result(self):
+        # Bitrix24 отвечает 200, но без ключа 'result' - запрос отклонен целиком
+        self.mock_post.return_value = _response({'error': 'INVALID_CREDENTIALS', 'error_description': 'Invalid request credentials'})
+
+        # Вызываем функцию
+        with self.assertLogs(level='INFO') as logs:
+            create_smart_process(_leads(1, 3))
+
+        # Ошибка записана в лог один раз на batch-запрос, записи не отмечены как созданные
+        errors = [record.getMessage() for record in logs.records if record.levelname == 'ERROR']
+        self.assertEqual(len(errors), 1)
+        self.assertIn('INVALID_CREDENTIALS', errors[0])
+        self.assertIn('Invalid request credentials', errors[0])
+        self.assertFalse(any('успешно создан' in line for line in logs.output))
+
+    def test_create_smart_process_batches(self):
+        # Подготавливаем фиктивный ответ от API
+        self.mock_post.return_value = _response(_BATCH_OK)
+
+        # Вызываем функцию для 120 записей
+        create_smart_process(_leads(0, 120))
+
+        # Записи отправлены тремя batch-запросами по 50, 50 и 20 команд
+        self.assertEqual(self.mock_post.call_count, 3)
+        sizes = sorted(len(json.loads(call.kwargs['data'])['cmd']) for call in self.mock_post.call_args_list)
+        self.assertEqual(sizes, [20, 50, 50])
+
+    def test_create_smart_process_uses_all_workers(self):
+        # Каждый запрос ждет, пока одновременно не будут отправлены запросы во всех потоках пула
+        barrier = threading.Barrier(_MAX_WORKERS, timeout=5)
+
+        def post(*args, **kwargs):
+            barrier.wait()
+            return _response(_BATCH_OK)
+
+        self.mock_post.side_effect = post
+
+        # Вызываем функцию для одной порции записей
+        create_smart_process(_leads(0, _CHUNK_SIZE))
 
-        # Проверяем, что запрос был отправлен дважды
-        self.assertEqual(mock_requests_post.call_count, 2)
+        # Все batch-запросы порции выполнялись одновременно
+        self.assertEqual(self.mock_post.call_count, _MAX_WORKERS)
+        self.assertFalse(barrier.broken)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file